@@ -1,6 +1,61 @@
+import argparse
+import multiprocessing
+import os
+import socket
+import tempfile
 import gradio as gr
+from database import Database
+from submission_queue import recover_journals
 from ui import create_ui
 
+def run_worker(worker_id, sock):
+    import uvicorn
+    from fastapi import FastAPI
+
+    # Events skip Gradio's in-process queue so any worker can answer any request
+    app = create_ui(worker_id=worker_id, queue=False)
+    # Uploads and generated audio live in the shared Gradio cache on disk; let every worker serve them
+    gradio_cache = os.environ.get("GRADIO_TEMP_DIR", os.path.join(tempfile.gettempdir(), "gradio"))
+    server = gr.mount_gradio_app(FastAPI(), app, path="/", allowed_paths=[gradio_cache])
+    uvicorn.Server(uvicorn.Config(server, log_level="info")).run(sockets=[sock])
+
+def serve(workers, host, port):
+    # All workers accept on one listening socket, so the kernel spreads connections across them
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(worker_id, sock), daemon=True)
+        for worker_id in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Serving {workers} workers on http://{host}:{port}")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    finally:
+        sock.close()
+
 if __name__ == "__main__":
-    app = create_ui()
-    app.launch()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="AI Agent Money Request System")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes sharing the port")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7860)
+    args = parser.parse_args()
+
+    # Replay every worker's journal, including ones from a run with a different --workers
+    recovered = recover_journals(Database())
+    if recovered:
+        print(f"Recovered {recovered} unsaved requests from journals")
+
+    if args.workers > 1:
+        serve(args.workers, args.host, args.port)
+    else:
+        app = create_ui()
+        app.launch(server_name=args.host, server_port=args.port)
@@ -0,0 +1,260 @@
+import argparse
+import csv
+import json
+import lzma
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from database import Database
+
+COLUMNS = ['id', 'timestamp', 'project_number', 'project_name', 'amount', 'reason', 'original_text']
+
+class RequestArchive:
+    """
+    Moves old rows out of the live requests table into compressed, columnar,
+    month-partitioned segment files, and reads live and archived rows through one interface.
+    Segments are only visible once listed in the archive_segments table, which is updated
+    in the same transaction that deletes the rows from the live table. Listed paths are
+    relative to archive_dir, so the archive can be opened from any working directory.
+    """
+    def __init__(self, db, archive_dir="archive", batch_size=5000):
+        self.db = db
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+
+    def archive_before(self, cutoff) -> int:
+        """Archive every request older than cutoff, batch by batch. Returns the number of rows moved."""
+        cutoff = str(cutoff)
+        self._remove_partial_segments()
+        archived = 0
+        while True:
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {", ".join(COLUMNS)} FROM requests
+                    WHERE timestamp < ? ORDER BY timestamp LIMIT ?
+                ''', (cutoff, self.batch_size))
+                rows = cursor.fetchall()
+            if not rows:
+                return archived
+            self._archive_batch(rows)
+            archived += len(rows)
+
+    def _archive_batch(self, rows):
+        # Rows arrive in timestamp order, so each batch spans only a few monthly partitions
+        partitions = {}
+        for row in rows:
+            partitions.setdefault(str(row[1])[:7], []).append(row)
+
+        segments = []
+        for partition, partition_rows in partitions.items():
+            path = self._write_segment(partition, partition_rows)
+            projects = json.dumps(sorted({row[2] for row in partition_rows}), ensure_ascii=False)
+            segments.append((path, partition, str(partition_rows[0][1]), str(partition_rows[-1][1]), len(partition_rows), projects))
+
+        # Keep per-project amount totals so z-score history survives archival
+        totals = {}
+        for row in rows:
+            count, total, total_squares = totals.get(row[2], (0, 0.0, 0.0))
+            amount = row[4] or 0.0
+            totals[row[2]] = (count + 1, total + amount, total_squares + amount * amount)
+
+        ids = [(row[0],) for row in rows]
+        for attempt in range(self.db.max_retries):
+            try:
+                with self.db.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany('''
+                        INSERT INTO archive_segments (path, partition, first_timestamp, last_timestamp, row_count, projects, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', [segment + (datetime.now(),) for segment in segments])
+                    cursor.executemany('''
+                        INSERT INTO archived_amount_stats (project_number, count, total, total_squares)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT (project_number) DO UPDATE SET
+                            count = count + excluded.count,
+                            total = total + excluded.total,
+                            total_squares = total_squares + excluded.total_squares
+                    ''', [(project_number,) + values for project_number, values in totals.items()])
+                    cursor.executemany('DELETE FROM requests WHERE id = ?', ids)
+                    conn.commit()
+                return
+            except sqlite3.OperationalError as e:
+                if attempt < self.db.max_retries - 1:
+                    time.sleep(self.db.retry_delay)
+                    continue
+                raise Exception(f"Could not archive requests after {self.db.max_retries} attempts: {str(e)}")
+
+    def _write_segment(self, partition, rows):
+        os.makedirs(os.path.join(self.archive_dir, f"month={partition}"), exist_ok=True)
+        # Every id is archived exactly once, so the smallest id names the segment uniquely
+        relative_path = os.path.join(f"month={partition}", f"segment-{min(row[0] for row in rows)}.json.xz")
+        path = os.path.join(self.archive_dir, relative_path)
+        segment = {
+            'columns': COLUMNS,
+            'data': {column: [row[i] for row in rows] for i, column in enumerate(COLUMNS)}
+        }
+        temp_path = f"{path}.tmp"
+        with lzma.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump(segment, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        return relative_path
+
+    def _remove_partial_segments(self, max_age=3600):
+        # Only half-written .tmp files from crashed runs; a complete segment is never deleted,
+        # even if unlisted, and a recent .tmp may belong to a run still in progress.
+        # An unlisted complete segment is harmless: readers ignore it and re-archiving overwrites it.
+        if not os.path.isdir(self.archive_dir):
+            return
+        now = time.time()
+        for root, _, files in os.walk(self.archive_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if name.endswith('.tmp') and now - os.path.getmtime(path) > max_age:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def iter_requests(self, start=None, end=None, project_number=None):
+        """Yield request dicts from the live table and then the archive, newest first."""
+        start = str(start) if start else None
+        end = str(end) if end else None
+        yield from self._iter_live(start, end, project_number)
+        yield from self._iter_archived(start, end, project_number)
+
+    def _iter_live(self, start, end, project_number):
+        conditions, params = self._filters(start, end, project_number)
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {", ".join(COLUMNS)} FROM requests {conditions}
+                ORDER BY timestamp DESC
+            ''', params)
+            for row in cursor:
+                yield dict(zip(COLUMNS, row))
+
+    def _iter_archived(self, start, end, project_number):
+        # Skip segments whose time range cannot overlap the requested window,
+        # or that hold no rows of the requested project
+        conditions = []
+        params = []
+        if start:
+            conditions.append('last_timestamp >= ?')
+            params.append(start)
+        if end:
+            conditions.append('first_timestamp < ?')
+            params.append(end)
+        if project_number:
+            conditions.append('(projects IS NULL OR EXISTS (SELECT 1 FROM json_each(projects) WHERE value = ?))')
+            params.append(str(project_number))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT path FROM archive_segments {where}
+                ORDER BY last_timestamp DESC
+            ''', params)
+            paths = [row[0] for row in cursor.fetchall()]
+
+        for path in paths:
+            with lzma.open(os.path.join(self.archive_dir, path), 'rt', encoding='utf-8') as f:
+                segment = json.load(f)
+            columns = segment['columns']
+            data = segment['data']
+            for i in reversed(range(len(data['id']))):
+                row = {column: data[column][i] for column in columns}
+                timestamp = str(row['timestamp'])
+                if start and timestamp < start:
+                    continue
+                if end and timestamp >= end:
+                    continue
+                if project_number and row['project_number'] != project_number:
+                    continue
+                yield row
+
+    def _filters(self, start, end, project_number):
+        conditions = []
+        params = []
+        if start:
+            conditions.append('timestamp >= ?')
+            params.append(start)
+        if end:
+            conditions.append('timestamp < ?')
+            params.append(end)
+        if project_number:
+            conditions.append('project_number = ?')
+            params.append(project_number)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+
+    def export_csv(self, path, **filters) -> int:
+        """Stream live and archived requests to a CSV file one row at a time."""
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for row in self.iter_requests(**filters):
+                writer.writerow([row[column] for column in COLUMNS])
+                count += 1
+        return count
+
+    def export_parquet(self, path, **filters) -> int:
+        """Stream live and archived requests to a Parquet file in row groups of batch_size (requires pyarrow)."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Parquet export requires pyarrow: pip install pyarrow")
+
+        schema = pa.schema([
+            ('id', pa.int64()),
+            ('timestamp', pa.string()),
+            ('project_number', pa.string()),
+            ('project_name', pa.string()),
+            ('amount', pa.float64()),
+            ('reason', pa.string()),
+            ('original_text', pa.string())
+        ])
+        count = 0
+        with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+            batch = []
+            for row in self.iter_requests(**filters):
+                row['timestamp'] = str(row['timestamp'])
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    count += len(batch)
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+        return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive and export money requests")
+    parser.add_argument("--db", default="requests.db")
+    parser.add_argument("--archive-dir", help="Defaults to an archive directory next to the database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    archive_parser = subparsers.add_parser("archive", help="Move requests older than --days into the archive")
+    archive_parser.add_argument("--days", type=int, default=365)
+    export_parser = subparsers.add_parser("export", help="Export live and archived requests to .csv or .parquet")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--start")
+    export_parser.add_argument("--end")
+    export_parser.add_argument("--project-number")
+    args = parser.parse_args()
+
+    archive_dir = args.archive_dir or os.path.join(os.path.dirname(os.path.abspath(args.db)), "archive")
+    archive = RequestArchive(Database(args.db), archive_dir)
+    if args.command == "archive":
+        count = archive.archive_before(datetime.now() - timedelta(days=args.days))
+        print(f"Archived {count} requests")
+    else:
+        filters = {'start': args.start, 'end': args.end, 'project_number': args.project_number}
+        if args.path.endswith('.parquet'):
+            count = archive.export_parquet(args.path, **filters)
+        else:
+            count = archive.export_csv(args.path, **filters)
+        print(f"Exported {count} requests to {args.path}")
@@ -0,0 +1,243 @@
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from database import Database
+from duplicate_detector import DuplicateDetector
+from submission_queue import SubmissionQueue
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def report_latency(label, samples):
+    print(f"{label}: p50={statistics.median(samples) * 1000:.3f}ms "
+          f"p99={percentile(samples, 99) * 1000:.3f}ms max={max(samples) * 1000:.3f}ms")
+
+def benchmark_submissions(count=2000):
+    """Submit latency and sustained writes/sec: direct add_request vs the write-behind queue."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "direct.db"))
+        samples = []
+        start = time.perf_counter()
+        for i in range(count):
+            t0 = time.perf_counter()
+            db.add_request(str(i % 50), f"Project {i % 50}", 100.0 + i, "Benchmark")
+            samples.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+        report_latency("direct add_request submit", samples)
+        print(f"direct add_request throughput: {count / elapsed:,.0f} writes/s")
+
+        db = Database(os.path.join(tmp, "queued.db"))
+        queue = SubmissionQueue(db, os.path.join(tmp, "queued.journal"))
+        samples = []
+        start = time.perf_counter()
+        for i in range(count):
+            t0 = time.perf_counter()
+            queue.submit(str(i % 50), f"Project {i % 50}", 100.0 + i, "Benchmark")
+            samples.append(time.perf_counter() - t0)
+        queue.flush()
+        elapsed = time.perf_counter() - start
+        queue.close()
+        report_latency("queued submit", samples)
+        print(f"queued throughput (until flushed): {count / elapsed:,.0f} writes/s")
+
+        # Submit latency while another connection holds the write lock
+        db = Database(os.path.join(tmp, "locked.db"))
+        queue = SubmissionQueue(db, os.path.join(tmp, "locked.journal"))
+        lock_conn = sqlite3.connect(db.db_name, check_same_thread=False)
+        lock_conn.execute("BEGIN EXCLUSIVE")
+        threading.Timer(2.0, lock_conn.rollback).start()
+        samples = []
+        for i in range(200):
+            t0 = time.perf_counter()
+            queue.submit("1", "Locked", 1.0, "Benchmark")
+            samples.append(time.perf_counter() - t0)
+        report_latency("queued submit with database locked", samples)
+        queue.flush()
+        queue.close()
+        lock_conn.close()
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def start_server(workers, port, workdir):
+    # Always the multi-worker serving path, so 1 worker and N workers are measured the same way
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    return subprocess.Popen(
+        [sys.executable, "-c", f"from app import serve; serve({workers}, '127.0.0.1', {port})"],
+        cwd=workdir, env={**os.environ, "PYTHONPATH": APP_DIR}, stdout=log, stderr=subprocess.STDOUT
+    )
+
+def wait_for_server(url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.5)
+    raise Exception(f"Server at {url} did not start within {timeout}s")
+
+def find_api_root(url):
+    # Gradio 5+ serves its HTTP API under /gradio_api; Gradio 4 serves it at the root
+    try:
+        with urllib.request.urlopen(f"{url}/gradio_api/info", timeout=5):
+            return f"{url}/gradio_api"
+    except OSError:
+        return url
+
+def submit_client(url, client_id, duration):
+    """Send submit_request events back to back for duration seconds; return per-request latencies and errors."""
+    samples = []
+    errors = 0
+    deadline = time.time() + duration
+    i = 0
+    while time.time() < deadline:
+        body = json.dumps({
+            'data': ['42', "Load Test", 500 + i, f"Load test request {client_id}-{i}"],
+            'session_hash': f"load-{client_id}-{i}"
+        }).encode('utf-8')
+        request = urllib.request.Request(f"{url}/run/submit_request", data=body,
+                                         headers={'Content-Type': 'application/json'})
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                result = json.loads(response.read())
+            if result['data'][0] != "Request successfully added!":
+                errors += 1
+        except (OSError, ValueError, KeyError):
+            errors += 1
+        samples.append(time.perf_counter() - t0)
+        i += 1
+    return samples, errors
+
+def benchmark_workers(max_workers=None, clients=16, duration=20):
+    """Load test: drive app.serve over HTTP with concurrent submit events at 1, 2, 4... workers."""
+    max_workers = max_workers or multiprocessing.cpu_count()
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        with tempfile.TemporaryDirectory() as workdir:
+            with socket.socket() as probe:
+                probe.bind(('127.0.0.1', 0))
+                port = probe.getsockname()[1]
+            url = f"http://127.0.0.1:{port}"
+            server = start_server(workers, port, workdir)
+            try:
+                wait_for_server(url)
+                api_root = find_api_root(url)
+                with multiprocessing.Pool(clients) as pool:
+                    results = pool.starmap(submit_client, [(api_root, client_id, duration) for client_id in range(clients)])
+            finally:
+                server.terminate()
+                server.wait()
+        samples = [sample for client_samples, _ in results for sample in client_samples]
+        errors = sum(client_errors for _, client_errors in results)
+        throughput = (len(samples) - errors) / duration
+        if not throughput:
+            raise Exception(f"Every request failed with {workers} worker(s)")
+        baseline = baseline or throughput
+        report_latency(f"{workers} worker(s)", samples)
+        print(f"{workers} worker(s): {throughput:,.0f} requests/s ({throughput / baseline:.2f}x), {errors} errors")
+        workers *= 2
+
+REASON_TEMPLATES = [
+    "{verb} {count} {item} for {place}",
+    "{item} {purpose} at {place}",
+    "Need {count} {item} urgently, {purpose}",
+    "{purpose}: {verb_lower} {item} ({vendor} quote)",
+    "Payment to {vendor} for {item}",
+    "{place} {item} {purpose}",
+]
+REASON_WORDS = {
+    'verb': ["Buying", "Repairing", "Renting", "Shipping", "Replacing", "Servicing", "Installing", "Upgrading"],
+    'item': ["laptops", "lab equipment", "office chairs", "printer toner", "vehicles", "air conditioners",
+             "network switches", "safety helmets", "generators", "survey drones", "water pumps", "projectors",
+             "welding kits", "tablets", "scaffolding", "concrete mixers", "fire extinguishers", "forklifts",
+             "software licences", "cleaning supplies", "uniforms", "tyres", "diesel", "cement bags"],
+    'place': ["the lab", "site office", "head office", "workshop", "warehouse", "Riyadh branch", "Jeddah branch",
+              "training centre", "client site", "data room", "Dammam yard", "pump station"],
+    'purpose': ["monthly maintenance", "new hires", "after the storm damage", "audit requirement",
+                "client handover", "phase two works", "annual renewal", "safety inspection", "breakdown"],
+    'vendor': ["Al Noor", "Gulf Supply", "Desert Tech", "Red Sea Trading", "Najd Services", "Eastern Tools"],
+}
+
+def random_reason(rng):
+    words = {key: rng.choice(values) for key, values in REASON_WORDS.items()}
+    words['verb_lower'] = words['verb'].lower()
+    return rng.choice(REASON_TEMPLATES).format(count=rng.randint(1, 40), **words)
+
+def benchmark_detector(rows=200_000, projects=1000, checks=10000, pending=50, resubmit_rate=0.05):
+    """
+    Duplicate/outlier check latency the way the UI runs it: a load(db)-backed detector that refreshes
+    from the shared database on every check, with this worker's unflushed submissions passed as pending
+    and another worker flushing new rows meanwhile. resubmit_rate of the checks repeat a recent request,
+    so the flagged share should land near it plus the amount outliers.
+    """
+    rng = random.Random(42)
+    now = datetime.now()
+    history = []
+    for i in range(rows):
+        timestamp = now - timedelta(days=30 * (1 - i / rows))
+        project_number = str(rng.randrange(projects))
+        history.append((timestamp, project_number, f"Project {project_number}",
+                        round(rng.lognormvariate(7, 0.5), 2), random_reason(rng), ""))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "detector.db"))
+        for i in range(0, rows, 5000):
+            db.add_requests_batch(history[i:i + 5000])
+        detector = DuplicateDetector()
+        start = time.perf_counter()
+        detector.load(db)
+        print(f"loaded {rows:,} rows in {time.perf_counter() - start:.1f}s")
+
+        pending_requests = [{
+            'id': None, 'seq': seq, 'timestamp': str(now), 'project_number': str(rng.randrange(projects)),
+            'project_name': "Pending", 'amount': round(rng.lognormvariate(7, 0.5), 2),
+            'reason': random_reason(rng), 'original_text': ""
+        } for seq in range(pending)]
+        recent = history[-rows // 4:]
+
+        samples = []
+        flagged = 0
+        duplicates = 0
+        for i in range(checks):
+            if i % 100 == 0:
+                # Another worker flushing its batch; picked up by the next check's refresh
+                db.add_requests_batch([(datetime.now(), str(rng.randrange(projects)), "Other worker",
+                                        round(rng.lognormvariate(7, 0.5), 2), random_reason(rng), "")
+                                       for _ in range(20)])
+            if rng.random() < resubmit_rate:
+                _, project_number, _, amount, reason, _ = rng.choice(recent)
+                amount = round(amount * rng.uniform(0.97, 1.03), 2)
+            else:
+                project_number, amount, reason = str(rng.randrange(projects)), round(rng.lognormvariate(7, 0.5), 2), random_reason(rng)
+            t0 = time.perf_counter()
+            result = detector.check(project_number, amount, reason, pending=pending_requests)
+            samples.append(time.perf_counter() - t0)
+            flagged += bool(result['duplicates'] or result['is_outlier'])
+            duplicates += bool(result['duplicates'])
+    report_latency(f"check ({rows // projects:,} rows per project, {pending} pending)", samples)
+    print(f"flagged {flagged:,} of {checks:,} checks ({flagged / checks:.1%}; {duplicates / checks:.1%} as duplicates, "
+          f"{resubmit_rate:.0%} were resubmissions)")
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "submissions"
+    if mode == "detector":
+        benchmark_detector(int(sys.argv[2]) if len(sys.argv) > 2 else 200_000)
+    elif mode == "workers":
+        benchmark_workers(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    else:
+        benchmark_submissions(int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
@@ -1,7 +1,8 @@
 import sqlite3
+import json
 from datetime import datetime
 import time
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 
 class Database:
     def __init__(self, db_name="requests.db"):
@@ -23,6 +24,8 @@ class Database:
             try:
                 with self.get_connection() as conn:
                     conn.execute('PRAGMA encoding="UTF-8"')
+                    # WAL lets every worker process read while one of them writes
+                    conn.execute('PRAGMA journal_mode=WAL')
                     cursor = conn.cursor()
                     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='requests'")
                     if not cursor.fetchone():
@@ -42,6 +45,8 @@ class Database:
                             ''')
                             cursor.execute('DROP TABLE requests_old')
                             conn.commit()
+                        else:
+                            self.create_table(conn)
                 return
             except sqlite3.OperationalError as e:
                 if attempt < self.max_retries - 1:
@@ -62,6 +67,44 @@ class Database:
                 original_text TEXT
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_requests_timestamp ON requests (timestamp)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS journal_checkpoint (
+                journal TEXT PRIMARY KEY,
+                seq INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archive_segments (
+                path TEXT PRIMARY KEY,
+                partition TEXT,
+                first_timestamp TEXT,
+                last_timestamp TEXT,
+                row_count INTEGER,
+                created_at DATETIME,
+                projects TEXT
+            )
+        ''')
+        # projects (a JSON list of the segment's project numbers) was added later; NULL means unknown
+        cursor.execute('PRAGMA table_info(archive_segments)')
+        if 'projects' not in [col[1] for col in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE archive_segments ADD COLUMN projects TEXT')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archived_amount_stats (
+                project_number TEXT PRIMARY KEY,
+                count INTEGER,
+                total REAL,
+                total_squares REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shared_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at DATETIME
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_shared_state_updated_at ON shared_state (updated_at)')
         conn.commit()
     
     def add_request(self, project_number, project_name, amount, reason, original_text=""):
@@ -94,4 +137,173 @@ class Database:
                 if attempt < self.max_retries - 1:
                     time.sleep(self.retry_delay)
                     continue
-                raise Exception(f"Could not fetch requests after {self.max_retries} attempts: {str(e)}")
\ No newline at end of file
+                raise Exception(f"Could not fetch requests after {self.max_retries} attempts: {str(e)}")
+    
+    def get_all_requests_with_checkpoint(self, journal):
+        # One read transaction, so the rows and the checkpoint describe the same snapshot
+        for attempt in range(self.max_retries):
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('BEGIN')
+                    cursor.execute('SELECT seq FROM journal_checkpoint WHERE journal = ?', (journal,))
+                    row = cursor.fetchone()
+                    cursor.execute('SELECT * FROM requests ORDER BY timestamp DESC')
+                    columns = [description[0] for description in cursor.description]
+                    results = cursor.fetchall()
+                    conn.commit()
+                    return [dict(zip(columns, row)) for row in results], row[0] if row else 0
+            except sqlite3.OperationalError as e:
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
+                    continue
+                raise Exception(f"Could not fetch requests after {self.max_retries} attempts: {str(e)}")
+    
+    def get_detector_snapshot(self, since):
+        # One read transaction, so the totals, the recent rows and last_id agree with each other
+        for attempt in range(self.max_retries):
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('BEGIN')
+                    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM requests')
+                    last_id = cursor.fetchone()[0]
+                    cursor.execute('''
+                        SELECT project_number, SUM(count), SUM(total), SUM(total_squares) FROM (
+                            SELECT project_number, COUNT(*) AS count, SUM(amount) AS total,
+                                   SUM(amount * amount) AS total_squares
+                            FROM requests GROUP BY project_number
+                            UNION ALL
+                            SELECT project_number, count, total, total_squares FROM archived_amount_stats
+                        ) GROUP BY project_number
+                    ''')
+                    stats = cursor.fetchall()
+                    cursor.execute('''
+                        SELECT project_number, timestamp, amount, reason FROM requests
+                        WHERE timestamp >= ? ORDER BY timestamp
+                    ''', (str(since),))
+                    rows = cursor.fetchall()
+                    conn.commit()
+                    return stats, rows, last_id
+            except sqlite3.OperationalError as e:
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
+                    continue
+                raise Exception(f"Could not fetch detector snapshot after {self.max_retries} attempts: {str(e)}")
+    
+    def get_requests_after(self, last_id, connection=None):
+        # Callers polling on every request pass their own open connection: opening one costs far more than the query
+        for attempt in range(self.max_retries):
+            try:
+                with (nullcontext(connection) if connection else self.get_connection()) as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT id, project_number, timestamp, amount, reason FROM requests
+                        WHERE id > ? ORDER BY id
+                    ''', (last_id,))
+                    return cursor.fetchall()
+            except sqlite3.OperationalError as e:
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
+                    continue
+                raise Exception(f"Could not fetch requests after {self.max_retries} attempts: {str(e)}")
+    
+    def add_requests_batch(self, rows, journal=None, journal_seq=None):
+        # Group commit: every row plus the journal checkpoint lands in one transaction,
+        # so a crash can never leave rows flushed without the checkpoint or vice versa.
+        for attempt in range(self.max_retries):
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany('''
+                        INSERT INTO requests (timestamp, project_number, project_name, amount, reason, original_text)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', rows)
+                    if journal is not None:
+                        cursor.execute('''
+                            INSERT OR REPLACE INTO journal_checkpoint (journal, seq) VALUES (?, ?)
+                        ''', (journal, journal_seq))
+                    conn.commit()
+                return
+            except sqlite3.OperationalError as e:
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
+                    continue
+                raise Exception(f"Could not add requests after {self.max_retries} attempts: {str(e)}")
+    
+    def get_journal_checkpoint(self, journal):
+        for attempt in range(self.max_retries):
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT seq FROM journal_checkpoint WHERE journal = ?', (journal,))
+                    row = cursor.fetchone()
+                    return row[0] if row else 0
+            except sqlite3.OperationalError as e:
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
+                    continue
+                raise Exception(f"Could not fetch journal checkpoint after {self.max_retries} attempts: {str(e)}")
+    
+    def get_state(self, key):
+        for attempt in range(self.max_retries):
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT value FROM shared_state WHERE key = ?', (key,))
+                    row = cursor.fetchone()
+                    return json.loads(row[0]) if row else None
+            except sqlite3.OperationalError as e:
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
+                    continue
+                raise Exception(f"Could not fetch state after {self.max_retries} attempts: {str(e)}")
+    
+    def set_state(self, key, value):
+        for attempt in range(self.max_retries):
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO shared_state (key, value, updated_at)
+                        VALUES (?, ?, ?)
+                    ''', (key, json.dumps(value, ensure_ascii=False), datetime.now()))
+                    conn.commit()
+                return
+            except sqlite3.OperationalError as e:
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
+                    continue
+                raise Exception(f"Could not save state after {self.max_retries} attempts: {str(e)}")
+    
+    def delete_state(self, key, before=None):
+        # With before, a value saved after that time (e.g. a newer step of the same session) is kept
+        for attempt in range(self.max_retries):
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    if before is None:
+                        cursor.execute('DELETE FROM shared_state WHERE key = ?', (key,))
+                    else:
+                        cursor.execute('DELETE FROM shared_state WHERE key = ? AND updated_at <= ?', (key, str(before)))
+                    conn.commit()
+                return
+            except sqlite3.OperationalError as e:
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
+                    continue
+                raise Exception(f"Could not delete state after {self.max_retries} attempts: {str(e)}")
+    
+    def expire_state(self, before):
+        for attempt in range(self.max_retries):
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('DELETE FROM shared_state WHERE updated_at < ?', (str(before),))
+                    conn.commit()
+                    return cursor.rowcount
+            except sqlite3.OperationalError as e:
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
+                    continue
+                raise Exception(f"Could not expire state after {self.max_retries} attempts: {str(e)}")
\ No newline at end of file
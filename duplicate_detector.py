@@ -0,0 +1,207 @@
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+import numpy as np
+
+SIGNATURE_BYTES = 32
+SIGNATURE_WORDS = SIGNATURE_BYTES // 8
+# Set bits per byte value, for NumPy versions without np.bitwise_count (added in 2.0)
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Set bits per row of a (rows, SIGNATURE_WORDS) uint64 array."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.uint16)
+    return POPCOUNT[words.view(np.uint8)].sum(axis=1)
+
+@lru_cache(maxsize=65536)
+def reason_signature(reason: str) -> np.ndarray:
+    """Hash the character 3-gram shingles of a reason into a fixed-size bitset of uint64 words."""
+    text = " ".join(re.findall(r'\w+', (reason or "").lower()))
+    signature = np.zeros(SIGNATURE_BYTES * 8, dtype=bool)
+    for i in range(max(1, len(text) - 2)):
+        signature[zlib.crc32(text[i:i + 3].encode('utf-8')) % (SIGNATURE_BYTES * 8)] = True
+    return np.packbits(signature).view(np.uint64)
+
+class _ProjectIndex:
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.start = 0
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.amounts = np.empty(capacity, dtype=np.float64)
+        self.signatures = np.empty((capacity, SIGNATURE_WORDS), dtype=np.uint64)
+        self.bits = np.empty(capacity, dtype=np.uint16)
+        self.reasons = []
+        # Running totals over the project's whole history for the amount z-score
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def append(self, timestamp, amount, signature, reason):
+        if self.size == len(self.timestamps):
+            self._grow()
+        self.timestamps[self.size] = timestamp
+        self.amounts[self.size] = amount
+        self.signatures[self.size] = signature
+        self.bits[self.size] = popcount(signature[np.newaxis])[0]
+        self.reasons.append(reason)
+        self.size += 1
+
+    def _grow(self):
+        # Copy into fresh arrays without the expired prefix; capacity doubles only if the live window is over half full
+        live = self.size - self.start
+        capacity = len(self.timestamps) * 2 if live > len(self.timestamps) // 2 else len(self.timestamps)
+        timestamps = np.empty(capacity, dtype=np.float64)
+        amounts = np.empty(capacity, dtype=np.float64)
+        signatures = np.empty((capacity, SIGNATURE_WORDS), dtype=np.uint64)
+        bits = np.empty(capacity, dtype=np.uint16)
+        timestamps[:live] = self.timestamps[self.start:self.size]
+        amounts[:live] = self.amounts[self.start:self.size]
+        signatures[:live] = self.signatures[self.start:self.size]
+        bits[:live] = self.bits[self.start:self.size]
+        self.timestamps, self.amounts, self.signatures, self.bits = timestamps, amounts, signatures, bits
+        self.reasons = self.reasons[self.start:]
+        self.size = live
+        self.start = 0
+
+    def window(self, cutoff):
+        """Mask of indexed rows newer than cutoff; also drops the leading run of expired rows."""
+        # Rows from different workers reach the database slightly out of timestamp order,
+        # so the window is a mask rather than a binary search over sorted timestamps
+        in_window = self.timestamps[self.start:self.size] >= cutoff
+        skip = int(np.argmax(in_window)) if in_window.any() else len(in_window)
+        self.start += skip
+        return in_window[skip:]
+
+def _best_matches(timestamps, amounts, signatures, bits, in_window, amount, signature,
+                  amount_tolerance, reason_threshold, max_matches):
+    """Positions and similarities of the closest matches: most similar first, then most recent."""
+    amount_close = np.abs(amounts - amount) <= amount_tolerance * np.maximum(np.abs(amounts), abs(amount))
+    candidates = np.flatnonzero(amount_close & in_window)
+    if not len(candidates):
+        return []
+    # Jaccard similarity of the hashed shingle sets, estimated from the bitsets
+    # |A | B| = |A| + |B| - |A & B|, so one popcount pass over the candidates is enough
+    shared = popcount(signatures[candidates] & signature)
+    union = bits[candidates] + popcount(signature[np.newaxis])[0] - shared
+    similarity = shared / np.maximum(union, 1)
+    matched = similarity >= reason_threshold
+    candidates, similarity = candidates[matched], similarity[matched]
+    best = np.lexsort((-timestamps[candidates], -similarity))[:max_matches]
+    return [(int(candidates[k]), float(similarity[k])) for k in best]
+
+class DuplicateDetector:
+    """
+    In-memory index of recent requests per project used before a request is saved.
+    Flags near-duplicates (similar amount and reason within window_days) and amount
+    outliers by z-score against the project's history, including archived requests.
+    Before each check the index pulls rows any worker has flushed to the shared database
+    since the last check; the caller passes its own not-yet-flushed submissions as pending.
+    Safe to share between handler threads: every read and write of the index holds self.lock.
+    """
+    def __init__(self, window_days=7, amount_tolerance=0.1, reason_threshold=0.4,
+                 z_threshold=3.0, min_history=5):
+        self.window = timedelta(days=window_days).total_seconds()
+        self.amount_tolerance = amount_tolerance
+        self.reason_threshold = reason_threshold
+        self.z_threshold = z_threshold
+        self.min_history = min_history
+        self.projects = {}
+        self.db = None
+        self.conn = None
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+    def load(self, db) -> None:
+        with self.lock:
+            since = datetime.now() - timedelta(seconds=self.window)
+            stats, rows, self.last_id = db.get_detector_snapshot(since)
+            for project_number, count, total, total_squares in stats:
+                index = self.projects.setdefault(str(project_number), _ProjectIndex())
+                index.count, index.total, index.total_squares = count, total or 0.0, total_squares or 0.0
+            for project_number, timestamp, amount, reason in rows:
+                index = self.projects.setdefault(str(project_number), _ProjectIndex())
+                index.append(datetime.fromisoformat(str(timestamp)).timestamp(), amount or 0.0,
+                             reason_signature(reason or ""), reason)
+            self.db = db
+            # Kept open for the per-check refresh; only used while holding self.lock
+            self.conn = sqlite3.connect(db.db_name, check_same_thread=False)
+
+    def _refresh(self):
+        # Requests flushed by any worker since the last check; ids are assigned at flush time,
+        # so every row is picked up exactly once regardless of which worker wrote it
+        for request_id, project_number, timestamp, amount, reason in self.db.get_requests_after(self.last_id, self.conn):
+            self._add(project_number, amount or 0.0, reason, datetime.fromisoformat(str(timestamp)).timestamp())
+            self.last_id = request_id
+
+    def add(self, project_number, amount, reason, timestamp=None) -> None:
+        """Index a request directly; used when the detector is not backed by a database."""
+        with self.lock:
+            self._add(project_number, amount, reason, timestamp)
+
+    def _add(self, project_number, amount, reason, timestamp):
+        index = self.projects.setdefault(str(project_number), _ProjectIndex())
+        index.append(timestamp or time.time(), float(amount), reason_signature(reason or ""), reason)
+        index.count += 1
+        index.total += float(amount)
+        index.total_squares += float(amount) ** 2
+
+    def check(self, project_number, amount, reason, timestamp=None, pending=(), max_matches=3) -> dict:
+        """
+        Score a request against the index. pending holds submissions accepted but not yet
+        in the database, as returned by SubmissionQueue.get_pending_requests.
+        """
+        with self.lock:
+            if self.db is not None:
+                self._refresh()
+            return self._check(str(project_number), float(amount), reason or "",
+                               timestamp or time.time(), pending, max_matches)
+
+    def _check(self, project_number, amount, reason, timestamp, pending, max_matches):
+        result = {'duplicates': [], 'z_score': None, 'is_outlier': False}
+        index = self.projects.get(project_number, _ProjectIndex(capacity=1))
+
+        if index.count >= self.min_history:
+            mean = index.total / index.count
+            variance = max(index.total_squares / index.count - mean * mean, 0.0)
+            if variance > 0:
+                result['z_score'] = (amount - mean) / variance ** 0.5
+                result['is_outlier'] = abs(result['z_score']) >= self.z_threshold
+
+        cutoff = timestamp - self.window
+        signature = reason_signature(reason)
+        in_window = index.window(cutoff)
+        timestamps = index.timestamps[index.start:index.size]
+        amounts = index.amounts[index.start:index.size]
+        matches = [(similarity, timestamps[i], amounts[i], index.reasons[index.start + i])
+                   for i, similarity in _best_matches(timestamps, amounts, index.signatures[index.start:index.size],
+                                                      index.bits[index.start:index.size], in_window, amount, signature, self.amount_tolerance,
+                                                      self.reason_threshold, max_matches)]
+
+        # Pending entries that were flushed after the caller's snapshot are already indexed
+        pending = [entry for entry in pending if str(entry['project_number']) == project_number]
+        if pending:
+            pending_timestamps = np.array([datetime.fromisoformat(str(entry['timestamp'])).timestamp() for entry in pending])
+            pending_amounts = np.array([float(entry['amount']) for entry in pending])
+            pending_signatures = np.array([reason_signature(entry['reason'] or "") for entry in pending])
+            pending_bits = popcount(pending_signatures)
+            unseen = (pending_timestamps >= cutoff) & ~np.isin(pending_timestamps, timestamps)
+            matches += [(similarity, pending_timestamps[i], pending_amounts[i], pending[i]['reason'])
+                        for i, similarity in _best_matches(pending_timestamps, pending_amounts, pending_signatures,
+                                                           pending_bits, unseen, amount, signature, self.amount_tolerance,
+                                                           self.reason_threshold, max_matches)]
+
+        # Most similar first; among equally similar matches, the most recent first
+        matches.sort(key=lambda match: (-match[0], -match[1]))
+        for match_similarity, match_timestamp, match_amount, match_reason in matches[:max_matches]:
+            result['duplicates'].append({
+                'timestamp': datetime.fromtimestamp(match_timestamp),
+                'amount': float(match_amount),
+                'reason': match_reason,
+                'similarity': float(match_similarity)
+            })
+        return result
@@ -114,6 +114,31 @@ class MemoryHandler:
         self.last_interaction_time = None
         return "Memory cleared!"
     
+    def to_dict(self) -> dict:
+        partial_info = dict(self.partial_info)
+        if partial_info['timestamp']:
+            partial_info['timestamp'] = partial_info['timestamp'].isoformat()
+        return {
+            'conversation_history': self.conversation_history,
+            'last_interaction_time': self.last_interaction_time.isoformat() if self.last_interaction_time else None,
+            'partial_info': partial_info,
+            'confidence_scores': self.confidence_scores
+        }
+    
+    @classmethod
+    def from_dict(cls, state: dict = None) -> 'MemoryHandler':
+        handler = cls()
+        if not state:
+            return handler
+        handler.conversation_history = state['conversation_history']
+        if state['last_interaction_time']:
+            handler.last_interaction_time = datetime.fromisoformat(state['last_interaction_time'])
+        handler.partial_info = state['partial_info']
+        if handler.partial_info['timestamp']:
+            handler.partial_info['timestamp'] = datetime.fromisoformat(handler.partial_info['timestamp'])
+        handler.confidence_scores = state['confidence_scores']
+        return handler
+    
     def get_missing_fields(self) -> list:
         missing = []
         confidence_threshold = 0.5
@@ -0,0 +1,202 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import threading
+from datetime import datetime
+
+class JournalInUse(Exception):
+    """Another SubmissionQueue, possibly in another process, already owns the journal."""
+
+class SubmissionQueue:
+    """
+    Write-behind queue in front of Database.add_request.
+    Submissions are appended to an fsync'd JSONL journal and acknowledged at once;
+    a background writer flushes them into SQLite in group-committed batches.
+    Each worker process needs its own journal_path; checkpoints are tracked per journal.
+    The queue holds an exclusive lock on journal_path + ".lock" until it is closed.
+    """
+    def __init__(self, db, journal_path="requests.journal", batch_size=200, flush_interval=0.05):
+        self.db = db
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = db.retry_delay
+        self.condition = threading.Condition()
+        self.pending = []
+        self.next_seq = 1
+        self.stopped = False
+        # A separate lock file, because recover replaces the journal file itself
+        self.lock_file = open(f"{journal_path}.lock", 'a')
+        try:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.lock_file.close()
+            raise JournalInUse(f"Journal {journal_path} is in use by another process")
+        self.recover()
+        self.writer = threading.Thread(target=self._run, name="submission-writer", daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def recover(self):
+        """Replay journal entries that were acknowledged but never reached the database."""
+        checkpoint = self.db.get_journal_checkpoint(self.journal_path)
+        entries = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as f:
+                lines = f.readlines()
+            for i, line in enumerate(lines):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Only the last line can be a torn write from a crash mid-append, and it was
+                    # never acknowledged; anything earlier is corruption of acknowledged entries
+                    if i == len(lines) - 1:
+                        break
+                    raise Exception(f"Corrupt entry on line {i + 1} of journal {self.journal_path}")
+                if entry['seq'] > checkpoint:
+                    entries.append(entry)
+
+        self.pending = [(entry['seq'], entry) for entry in entries]
+        self.next_seq = max([checkpoint] + [entry['seq'] for entry in entries]) + 1
+
+        # Rewrite the journal with only the unflushed entries so a torn tail is dropped
+        temp_path = f"{self.journal_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            for entry in entries:
+                f.write(self._encode(entry))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.journal_path)
+        # Unbuffered, so a failed append leaves nothing behind in a buffer to be written later
+        self.journal = open(self.journal_path, 'ab', buffering=0)
+        return len(entries)
+
+    def _encode(self, entry):
+        return (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+
+    def submit(self, project_number, project_name, amount, reason, original_text=""):
+        with self.condition:
+            if self.stopped:
+                raise Exception("Submission queue is closed")
+            entry = {
+                'seq': self.next_seq,
+                'timestamp': datetime.now().isoformat(),
+                'project_number': project_number,
+                'project_name': project_name,
+                'amount': amount,
+                'reason': reason,
+                'original_text': original_text
+            }
+            offset = self.journal.tell()
+            try:
+                self.journal.write(self._encode(entry))
+                os.fsync(self.journal.fileno())
+            except Exception:
+                # Cut off a partial entry so the next append does not follow a torn line
+                self.journal.truncate(offset)
+                self.journal.seek(offset)
+                raise
+            self.next_seq += 1
+            self.pending.append((entry['seq'], entry))
+            self.condition.notify_all()
+            return entry['seq']
+
+    def get_pending_requests(self):
+        """Requests acknowledged but not yet flushed, newest first, shaped like get_all_requests rows."""
+        with self.condition:
+            entries = [entry for _, entry in self.pending]
+        return [{
+            'id': None,
+            'seq': entry['seq'],
+            'timestamp': str(datetime.fromisoformat(entry['timestamp'])),
+            'project_number': entry['project_number'],
+            'project_name': entry['project_name'],
+            'amount': entry['amount'],
+            'reason': entry['reason'],
+            'original_text': entry['original_text']
+        } for entry in reversed(entries)]
+
+    def get_all_requests(self):
+        """Flushed and pending requests, newest first, with no request listed twice."""
+        pending = self.get_pending_requests()
+        requests, checkpoint = self.db.get_all_requests_with_checkpoint(self.journal_path)
+        # Entries flushed after the pending snapshot are already in requests
+        pending = [entry for entry in pending if entry['seq'] > checkpoint]
+        return pending + requests
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if not self.pending and self.stopped:
+                    return
+                # Give concurrent submitters a moment to join this batch
+                if len(self.pending) < self.batch_size and not self.stopped:
+                    self.condition.wait(self.flush_interval)
+                batch = self.pending[:self.batch_size]
+
+            rows = [(
+                datetime.fromisoformat(entry['timestamp']),
+                entry['project_number'],
+                entry['project_name'],
+                entry['amount'],
+                entry['reason'],
+                entry['original_text']
+            ) for _, entry in batch]
+            try:
+                self.db.add_requests_batch(rows, journal=self.journal_path, journal_seq=batch[-1][0])
+            except Exception as e:
+                print(f"Error flushing submissions: {str(e)}")
+                with self.condition:
+                    if self.stopped:
+                        return
+                    self.condition.wait(self.retry_delay)
+                continue
+
+            with self.condition:
+                del self.pending[:len(batch)]
+                if not self.pending:
+                    # Everything up to the checkpoint is in SQLite, so the journal can be reset
+                    self.journal.truncate(0)
+                    self.journal.seek(0)
+                    os.fsync(self.journal.fileno())
+                self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until every acknowledged submission is committed to the database."""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending, timeout)
+
+    def close(self):
+        with self.condition:
+            if self.stopped:
+                return
+            self.stopped = True
+            self.condition.notify_all()
+        self.writer.join()
+        self.journal.close()
+        self.lock_file.close()
+
+def recover_journals(db, pattern="requests*.journal"):
+    """
+    Drain every journal matching pattern into the database, whichever worker wrote it.
+    Run at startup before any worker opens its journal, so entries acknowledged by a
+    worker id that no longer exists (e.g. after restarting with fewer workers) are not lost.
+    Journals locked by a running queue are skipped: their owner is still flushing them.
+    """
+    recovered = 0
+    for journal_path in sorted(glob.glob(pattern)):
+        try:
+            queue = SubmissionQueue(db, journal_path)
+        except JournalInUse as e:
+            print(f"Skipping journal recovery: {str(e)}")
+            continue
+        recovered += len(queue.pending)
+        queue.flush()
+        # Removed while still locked, so no other queue can have opened it in the meantime
+        os.remove(journal_path)
+        queue.close()
+    return recovered
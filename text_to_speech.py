@@ -1,11 +1,32 @@
 from gtts import gTTS
-import io
+import os
+import tempfile
+import time
+
+# Gradio copies returned audio into its own cache, so our copies only need to outlive the response
+TTS_DIR = os.path.join(tempfile.gettempdir(), "money_request_tts")
+TTS_MAX_AGE = 600
+
+def remove_old_audio():
+    now = time.time()
+    for name in os.listdir(TTS_DIR):
+        path = os.path.join(TTS_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > TTS_MAX_AGE:
+                os.remove(path)
+        except OSError:
+            # Another worker removed it first
+            pass
 
 def play_text(text: str) -> tuple[str, str]:
     try:
+        os.makedirs(TTS_DIR, exist_ok=True)
+        remove_old_audio()
         tts = gTTS(text=text, lang='en')
-        audio_path = "temp_audio.mp3"
+        # A unique file per call so concurrent requests and worker processes don't overwrite each other
+        with tempfile.NamedTemporaryFile(dir=TTS_DIR, prefix="tts_", suffix=".mp3", delete=False) as temp_audio:
+            audio_path = temp_audio.name
         tts.save(audio_path)
         return audio_path, None
     except Exception as e:
-        return None, f"Error generating audio: {str(e)}"
\ No newline at end of file
+        return None, f"Error generating audio: {str(e)}"
@@ -1,17 +1,59 @@
+import threading
+from datetime import datetime, timedelta
 import gradio as gr
 import pandas as pd
 from database import Database
+from submission_queue import SubmissionQueue
+from duplicate_detector import DuplicateDetector
 from voice import VoiceHandler
 from gemini import GeminiProcessor
 from memory import MemoryHandler
 from text_to_speech import play_text
 
-def create_ui():
+def create_ui(worker_id=None, queue=True):
     # Initialize components
     db = Database()
+    journal_path = "requests.journal" if worker_id is None else f"requests.{worker_id}.journal"
+    submission_queue = SubmissionQueue(db, journal_path)
+    duplicate_detector = DuplicateDetector()
+    duplicate_detector.load(db)
     voice_handler = VoiceHandler()
     gemini_processor = GeminiProcessor()
-    memory_handler = MemoryHandler()
+
+    # Session memory lives in the database so any worker process can serve the next step.
+    # Rows of sessions abandoned for longer than memory_ttl are expired on startup and then
+    # at most once per memory_expire_interval, piggybacking on submits.
+    memory_ttl = timedelta(hours=1)
+    memory_expire_interval = timedelta(minutes=5)
+    memory_expire_lock = threading.Lock()
+    memory_expired_at = datetime.now()
+    db.expire_state(memory_expired_at - memory_ttl)
+
+    def load_memory(request):
+        return MemoryHandler.from_dict(db.get_state(f"memory:{request.session_hash}"))
+
+    def save_memory(request, memory_handler):
+        db.set_state(f"memory:{request.session_hash}", memory_handler.to_dict())
+
+    def expire_memory():
+        nonlocal memory_expired_at
+        with memory_expire_lock:
+            if datetime.now() - memory_expired_at < memory_expire_interval:
+                return
+            memory_expired_at = datetime.now()
+        db.expire_state(memory_expired_at - memory_ttl)
+
+    def clear_memory(request):
+        # Best-effort and off the request thread: the submission is already safe in the journal.
+        # Only memory saved before the submit is cleared; the session may have started a new request since.
+        submitted_at = datetime.now()
+        def clear():
+            try:
+                db.delete_state(f"memory:{request.session_hash}", before=submitted_at)
+                expire_memory()
+            except Exception as e:
+                print(f"Error clearing session memory: {str(e)}")
+        threading.Thread(target=clear, daemon=True).start()
 
     def validate_request(project_number, project_name, amount, reason):
         if not project_number or not project_name or not amount or not reason:
@@ -23,10 +65,11 @@ def create_ui():
             return False, f"Please provide: {', '.join(missing_fields)}"
         return True, ""
 
-    def process_text_input(text, language):
+    def process_text_input(text, language, request: gr.Request):
         if not text:
             return "Please enter some text first.", None, None, None, None
         
+        memory_handler = load_memory(request)
         context = memory_handler.get_context()
         details = gemini_processor.extract_request_details(text, context)
         
@@ -34,6 +77,7 @@ def create_ui():
             return "Could not extract request details. Please try again.", None, None, None, None
         
         memory_handler.add_interaction(text, details)
+        save_memory(request, memory_handler)
         partial_info = memory_handler.get_partial_info()
         
         return (
@@ -44,7 +88,7 @@ def create_ui():
             partial_info.get('reason', '')
         )
 
-    def process_voice_input(audio_path, language):
+    def process_voice_input(audio_path, language, request: gr.Request):
         if not audio_path:
             return "No audio detected.", None, None, None, None
         
@@ -52,6 +96,7 @@ def create_ui():
         if voice_text.startswith("Error:"):
             return voice_text, None, None, None, None
         
+        memory_handler = load_memory(request)
         context = memory_handler.get_context()
         details = gemini_processor.extract_request_details(voice_text, context)
         
@@ -59,6 +104,7 @@ def create_ui():
             return "Could not extract request details. Please try again.", None, None, None, None
         
         memory_handler.add_interaction(voice_text, details)
+        save_memory(request, memory_handler)
         partial_info = memory_handler.get_partial_info()
 
         return (
@@ -69,6 +115,24 @@ def create_ui():
             partial_info.get('reason', '')
         )
 
+    def describe_flags(project_number, amount, reason):
+        # Warnings are advisory: if the check fails, confirm without them rather than block the request
+        try:
+            flags = duplicate_detector.check(project_number, amount, reason,
+                                             pending=submission_queue.get_pending_requests())
+        except Exception as e:
+            print(f"Error checking for duplicates: {str(e)}")
+            return ""
+        warnings = []
+        for match in flags['duplicates']:
+            warnings.append(
+                f"Possible duplicate: {match['amount']} riyals on {match['timestamp']:%Y-%m-%d %H:%M} "
+                f"for \"{match['reason']}\" (reason similarity {match['similarity']:.0%})"
+            )
+        if flags['is_outlier']:
+            warnings.append(f"Unusual amount for project {project_number} (z-score {flags['z_score']:.1f})")
+        return "\n".join(warnings)
+
     def confirm_submission(project_number, project_name, amount, reason):
         is_valid, message = validate_request(project_number, project_name, amount, reason)
         if not is_valid:
@@ -98,8 +162,13 @@ def create_ui():
                 gr.update(interactive=True)    # reason
             )
         
+        message = "Please confirm the details you heard."
+        warnings = describe_flags(project_number, amount, reason)
+        if warnings:
+            message += f"\n\nWarning:\n{warnings}"
+        
         return (
-            "Please confirm the details you heard.",  # confirmation_output
+            message,                                 # confirmation_output
             audio_path,                              # confirmation_audio
             gr.update(interactive=True),             # submit_btn
             gr.update(interactive=False),            # confirm_btn
@@ -109,22 +178,22 @@ def create_ui():
             gr.update(interactive=False)             # reason
         )
 
-    def submit_request(project_number, project_name, amount, reason):
+    def submit_request(project_number, project_name, amount, reason, request: gr.Request):
         is_valid, message = validate_request(project_number, project_name, amount, reason)    
 
         if not is_valid:
             return message, None
         
         try:
-            db.add_request(project_number, project_name, float(amount), reason)
-            memory_handler.clear_memory()
-            return "Request successfully added!", get_requests_df()
+            submission_queue.submit(project_number, project_name, float(amount), reason)
         except Exception as e:
             return f"Error saving request: {str(e)}", None
+        clear_memory(request)
+        return "Request successfully added!", get_requests_df()
 
     def get_requests_df():
         try:
-            requests = db.get_all_requests()
+            requests = submission_queue.get_all_requests()
             if requests:
                 df = pd.DataFrame(requests)
                 columns = ['timestamp', 'project_number', 'project_name', 'amount', 'reason']
@@ -211,13 +280,15 @@ def create_ui():
         text_process_btn.click(
             process_text_input,
             inputs=[text_input, language],
-            outputs=[process_output, project_number, project_name, amount, reason]
+            outputs=[process_output, project_number, project_name, amount, reason],
+            queue=queue
         )
         
         voice_process_btn.click(
             process_voice_input,
             inputs=[audio_input, language],
-            outputs=[process_output, project_number, project_name, amount, reason]
+            outputs=[process_output, project_number, project_name, amount, reason],
+            queue=queue
         )
         
         # Confirm button handler with proper submit button and form field state management
@@ -233,14 +304,16 @@ def create_ui():
                 project_name,
                 amount,
                 reason
-            ]
+            ],
+            queue=queue
         )
         
         # Submit button handler with form reset
         submit_btn.click(
             submit_request,
             inputs=[project_number, project_name, amount, reason],
-            outputs=[result_text, requests_table]
+            outputs=[result_text, requests_table],
+            queue=queue
         ).then(
             reset_form,
             outputs=[
@@ -259,12 +332,14 @@ def create_ui():
                 text_input,
                 audio_input,
                 process_output
-            ]
+            ],
+            queue=queue
         )
         
         refresh_btn.click(
             lambda: get_requests_df(),
-            outputs=[requests_table]
+            outputs=[requests_table],
+            queue=queue
         )
         
         # Initialize requests table